@@ -1,261 +1,538 @@
-"""
-License Management System - Main Flask Application
-Handles license activation, validation, and admin management
-"""
-
-import os
-import secrets
-from datetime import datetime, timedelta
-from functools import wraps
-
-import jwt
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_wtf.csrf import CSRFProtect
-from werkzeug.security import generate_password_hash, check_password_hash
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(32))
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///license_system.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', secrets.token_hex(32))
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
-
-# Initialize extensions
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'admin_login'
-csrf = CSRFProtect(app)
-
-# Import models after db initialization
-from models import AdminUser, License, Device, AuditLog
-
-# Flask-Login user loader
-@login_manager.user_loader
-def load_user(user_id):
-    return AdminUser.query.get(int(user_id))
-
-# JWT Authentication decorator
-def jwt_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            current_user_id = data['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token is invalid'}), 401
-        return f(current_user_id, *args, **kwargs)
-    return decorated
-
-# -------------------
-# API Routes
-# -------------------
-
-@app.route("/")
-def home():
-    return "License Management System server is running!"
-
-@app.route('/activate', methods=['POST'])
-def activate_license():
-    """
-    Activate a license for a device
-    Expected JSON: {"license_key": "string", "device_id": "string", "device_info": "string"}
-    """
-    try:
-        data = request.get_json()
-        if not data or not all(k in data for k in ['license_key', 'device_id']):
-            return jsonify({'error': 'Missing required fields'}), 400
-
-        license_key = data['license_key']
-        device_id = data['device_id']
-        device_info = data.get('device_info', '')
-
-        license_obj = License.query.filter_by(key=license_key).first()
-        if not license_obj:
-            return jsonify({'error': 'Invalid license key'}), 404
-
-        if license_obj.status != 'active':
-            return jsonify({'error': 'License is not active'}), 400
-
-        if license_obj.expires_at and license_obj.expires_at < datetime.utcnow():
-            license_obj.status = 'expired'
-            db.session.commit()
-            return jsonify({'error': 'License has expired'}), 400
-
-        existing_device = Device.query.filter_by(device_id=device_id).first()
-        if existing_device:
-            if existing_device.license_id == license_obj.id:
-                token = jwt.encode({
-                    'user_id': device_id,
-                    'license_id': license_obj.id,
-                    'exp': datetime.utcnow() + app.config['JWT_ACCESS_TOKEN_EXPIRES']
-                }, app.config['JWT_SECRET_KEY'], algorithm='HS256')
-                return jsonify({
-                    'success': True,
-                    'token': token,
-                    'license_status': license_obj.status,
-                    'expires_at': license_obj.expires_at.isoformat() if license_obj.expires_at else None
-                })
-            else:
-                return jsonify({'error': 'Device already registered with different license'}), 400
-
-        device = Device(
-            device_id=device_id,
-            license_id=license_obj.id,
-            device_info=device_info,
-            registered_at=datetime.utcnow()
-        )
-        db.session.add(device)
-
-        audit_log = AuditLog(
-            action='license_activated',
-            license_id=license_obj.id,
-            device_id=device_id,
-            details=f'Device {device_id} activated license {license_key}'
-        )
-        db.session.add(audit_log)
-        db.session.commit()
-
-        token = jwt.encode({
-            'user_id': device_id,
-            'license_id': license_obj.id,
-            'exp': datetime.utcnow() + app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        }, app.config['JWT_SECRET_KEY'], algorithm='HS256')
-
-        return jsonify({
-            'success': True,
-            'token': token,
-            'license_status': license_obj.status,
-            'expires_at': license_obj.expires_at.isoformat() if license_obj.expires_at else None
-        })
-
-    except Exception:
-        db.session.rollback()
-        return jsonify({'error': 'Internal server error'}), 500
-
-
-@app.route('/validate', methods=['POST'])
-@jwt_required
-def validate_license(user_id):
-    """
-    Validate a license for a device
-    Requires JWT token in Authorization header
-    """
-    try:
-        device = Device.query.filter_by(device_id=user_id).first()
-        if not device:
-            return jsonify({'error': 'Device not found'}), 404
-
-        license_obj = License.query.get(device.license_id)
-        if not license_obj:
-            return jsonify({'error': 'License not found'}), 404
-
-        if license_obj.status != 'active':
-            return jsonify({'error': 'License is not active', 'status': license_obj.status}), 400
-
-        if license_obj.expires_at and license_obj.expires_at < datetime.utcnow():
-            license_obj.status = 'expired'
-            db.session.commit()
-            return jsonify({'error': 'License has expired', 'status': 'expired'}), 400
-
-        device.last_validated = datetime.utcnow()
-        db.session.commit()
-
-        return jsonify({
-            'valid': True,
-            'license_status': license_obj.status,
-            'expires_at': license_obj.expires_at.isoformat() if license_obj.expires_at else None,
-            'days_remaining': (license_obj.expires_at - datetime.utcnow()).days if license_obj.expires_at else None
-        })
-
-    except Exception:
-        return jsonify({'error': 'Internal server error'}), 500
-
-
-# -------------------
-# Admin Routes
-# -------------------
-
-@app.route('/admin/login', methods=['GET', 'POST'])
-def admin_login():
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-
-        admin = AdminUser.query.filter_by(username=username).first()
-        if admin and check_password_hash(admin.password_hash, password):
-            login_user(admin)
-            return redirect(url_for('admin_dashboard'))
-        else:
-            flash('Invalid username or password', 'error')
-
-    return render_template('admin/login.html')
-
-
-@app.route('/admin/logout')
-@login_required
-def admin_logout():
-    logout_user()
-    return redirect(url_for('admin_login'))
-
-
-@app.route('/admin')
-@login_required
-def admin_dashboard():
-    licenses = License.query.all()
-    devices = Device.query.all()
-    recent_logs = AuditLog.query.order_by(AuditLog.created_at.desc()).limit(10).all()
-    return render_template('admin/dashboard.html', licenses=licenses, devices=devices, recent_logs=recent_logs)
-
-
-@app.route('/admin/licenses')
-@login_required
-def admin_licenses():
-    licenses = License.query.all()
-    return render_template('admin/licenses.html', licenses=licenses)
-
-
-@app.route('/admin/licenses/create', methods=['POST'])
-@login_required
-def create_license():
-    try:
-        key = request.form.get('key')
-        duration_days = int(request.form.get('duration_days', 7))
-
-        if not key:
-            flash('License key is required', 'error')
-            return redirect(url_for('admin_licenses'))
-
-        if License.query.filter_by(key=key).first():
-            flash('License key already exists', 'error')
-            return redirect(url_for('admin_licenses'))
-
-        expires_at = datetime.utcnow() + timedelta(days=duration_days)
-        license_obj = License(key=key, status='active', expires_at=expires_at, created_by=current_user.id)
-        db.session.add(license_obj)
-        db.session.commit()
-
-        flash('License created successfully', 'success')
-        return redirect(url_for('admin_licenses'))
-
-    except Exception as e:
-    # log sau return error
-    print(e)
-    return jsonify({'error': 'Internal server error'}), 500
-
+"""
+License Management System - Main Flask Application
+Handles license activation, validation, and admin management
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import queue
+import secrets
+import threading
+import time
+from datetime import timedelta, timezone
+from functools import wraps
+
+import jwt
+import orjson
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerifyMismatchError
+from cachetools import TTLCache
+from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask_migrate import Migrate
+from flask_wtf.csrf import CSRFProtect
+from sqlalchemy import event, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.security import check_password_hash
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Initialize Flask app
+app = Flask(__name__)
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(32))
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///license_system.db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', secrets.token_hex(32))
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+# Pool sizing for long-lived gunicorn workers: every worker gets its own
+# pool, so keep it small. pre_ping replaces stale connections that would
+# otherwise surface as generic 500s; recycle beats most idle timeouts.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 2,
+    'max_overflow': 4,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
+# Admin pages are large, repetitive HTML - compress anything over 1KB,
+# preferring brotli (quality 4 is near-free CPU for ~5x on HTML)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_BR_LEVEL'] = 4
+
+# orjson-backed JSON provider: encodes at C speed and serializes datetimes
+# natively, so responses need no manual isoformat() formatting
+class ORJSONProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        # Must return str: the session cookie path feeds this through
+        # itsdangerous, which chokes on bytes
+        return orjson.dumps(obj, option=orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # jsonify path: hand the response body over as bytes, skipping the
+        # decode/re-encode round-trip dumps() pays for cookie compatibility
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC),
+            mimetype='application/json'
+        )
+
+app.json = ORJSONProvider(app)
+
+# Initialize extensions on the models' SQLAlchemy instance - a second
+# SQLAlchemy(app) here would leave models.db unregistered and every
+# model query raising RuntimeError
+from models import db
+db.init_app(app)
+migrate = Migrate(app, db)
+login_manager = LoginManager()
+login_manager.init_app(app)
+login_manager.login_view = 'admin_login'
+csrf = CSRFProtect(app)
+compress = Compress(app)
+
+# Dev SQLite: WAL avoids the per-commit fsync of the default rollback
+# journal and lets readers proceed while a write is in flight
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    @event.listens_for(Engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+# Import models after db initialization
+from models import AdminUser, License, Device, AuditLog, LicenseRow, DeviceRow, utcnow
+
+def _device_insert():
+    """INSERT statement with ON CONFLICT support for the active dialect"""
+    if db.engine.dialect.name == 'postgresql':
+        return pg_insert(Device)
+    return sqlite_insert(Device)
+
+def _page_rows(stmt, page, per_page=50):
+    """Fetch one page of a Core column select as full Row tuples.
+
+    db.paginate applies .scalars() to select() statements, which collapses
+    multi-column rows to their first column, so paginate manually here.
+    """
+    return db.session.execute(
+        stmt.limit(per_page).offset((page - 1) * per_page)
+    ).all()
+
+# Audit writes happen off the request path: handlers enqueue a mapping and a
+# daemon thread batch-inserts roughly every 200ms, so clients never wait on
+# the audit insert and its fsync is amortized across many activations.
+# Entries are best-effort - a hard crash can lose the last unflushed batch.
+_audit_queue = queue.Queue()
+
+def _audit_writer():
+    while True:
+        batch = [_audit_queue.get()]
+        time.sleep(0.2)
+        try:
+            while True:
+                batch.append(_audit_queue.get_nowait())
+        except queue.Empty:
+            pass
+        with app.app_context():
+            try:
+                db.session.bulk_insert_mappings(AuditLog, batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Audit batch insert failed')
+
+threading.Thread(target=_audit_writer, name='audit-writer', daemon=True).start()
+
+# Expired licenses are reaped in bulk once a minute - one UPDATE and one
+# fsync for any number of rows - instead of each request paying a write when
+# it happens to notice the expiry. The handlers only compare expires_at.
+def _license_expirer():
+    while True:
+        time.sleep(60)
+        with app.app_context():
+            try:
+                db.session.execute(
+                    update(License)
+                    .where(License.status == 'active', License.expires_at < utcnow())
+                    .values(status='expired')
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('License expiry sweep failed')
+
+threading.Thread(target=_license_expirer, name='license-expirer', daemon=True).start()
+
+# Flask-Login user loader
+@login_manager.user_loader
+def load_user(user_id):
+    return AdminUser.query.get(int(user_id))
+
+# Argon2id tuned for roughly 30ms per verify. Memory-hard, so the same
+# login latency costs a GPU attacker far more than the old pbkdf2:sha256
+# default of generate_password_hash.
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
+# Dummy hash verified when the username does not exist, so a login attempt
+# takes the same time whether or not the admin account is real. Without it,
+# unknown usernames return measurably faster and leak account existence.
+_DUMMY_PASSWORD_HASH = _password_hasher.hash('dummy')
+
+def _verify_password(password_hash, password):
+    """Verify a password against an argon2 hash, or a legacy werkzeug hash"""
+    if password_hash.startswith('$argon2'):
+        try:
+            return _password_hasher.verify(password_hash, password)
+        except (VerifyMismatchError, InvalidHashError):
+            return False
+    return check_password_hash(password_hash, password)
+
+# Cache of already-verified JWT payloads, keyed by SHA-256 of the raw token.
+# Clients reuse the same token for its 24h lifetime, so caching the decoded
+# payload skips the HS256 verification on repeat requests. The short TTL keeps
+# the revocation window bounded; the token's own 'exp' is still checked on
+# every hit. Failed decodes are never cached.
+_jwt_cache = TTLCache(maxsize=10000, ttl=60)
+_jwt_cache_lock = threading.RLock()
+
+# Signing key as bytes so PyJWT skips the str->bytes conversion on every call
+_JWT_SECRET_BYTES = app.config['JWT_SECRET_KEY'].encode()
+
+# HMAC state keyed once at startup; .copy() clones it in a single memcpy,
+# skipping the two key-schedule SHA-256 block compressions hmac.new() runs
+# on every call
+_hmac_template = hmac.new(_JWT_SECRET_BYTES, b'', hashlib.sha256)
+
+# The header never changes, so its base64url form is a constant
+_JWT_HEADER_B64 = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+
+def _hs256_sign(msg):
+    h = _hmac_template.copy()
+    h.update(msg)
+    return h.digest()
+
+def _hs256_verify(msg, sig):
+    return hmac.compare_digest(_hs256_sign(msg), sig)
+
+def _b64url_decode(data):
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+def _issue_token(device_id, license_id, now):
+    """Issue a signed device token (shared by both /activate branches)"""
+    exp = int((now + app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+              .replace(tzinfo=timezone.utc).timestamp())
+    payload = orjson.dumps({'user_id': device_id, 'license_id': license_id, 'exp': exp})
+    signing_input = _JWT_HEADER_B64 + b'.' + base64.urlsafe_b64encode(payload).rstrip(b'=')
+    signature = base64.urlsafe_b64encode(_hs256_sign(signing_input)).rstrip(b'=')
+    return (signing_input + b'.' + signature).decode()
+
+def _decode_token(token):
+    """Verify an HS256 token and return its payload.
+
+    Raises the same PyJWT exceptions jwt.decode would, so callers keep
+    their ExpiredSignatureError/InvalidTokenError handling. Only the exp
+    claim is validated (our tokens carry no nbf/iat/aud/iss), and the
+    claims the decorator reads are required up front.
+    """
+    try:
+        signing_input, sig_b64 = token.rsplit('.', 1)
+        header_b64, payload_b64 = signing_input.split('.')
+        signature = _b64url_decode(sig_b64.encode())
+        if not _hs256_verify(signing_input.encode(), signature):
+            raise jwt.InvalidSignatureError('Signature verification failed')
+        header = orjson.loads(_b64url_decode(header_b64.encode()))
+        if header.get('alg') != 'HS256':
+            raise jwt.InvalidAlgorithmError('The specified alg value is not allowed')
+        payload = orjson.loads(_b64url_decode(payload_b64.encode()))
+    except jwt.InvalidTokenError:
+        raise
+    except (ValueError, TypeError):
+        raise jwt.DecodeError('Invalid token')
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError('Invalid payload')
+    for claim in ('exp', 'user_id', 'license_id'):
+        if claim not in payload:
+            raise jwt.MissingRequiredClaimError(claim)
+    if payload['exp'] <= time.time():
+        raise jwt.ExpiredSignatureError('Signature has expired')
+    return payload
+
+# JWT Authentication decorator
+def jwt_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'error': 'Token is missing'}), 401
+        if token.startswith('Bearer '):
+            token = token[7:]
+        cache_key = hashlib.sha256(token.encode()).digest()
+        with _jwt_cache_lock:
+            entry = _jwt_cache.get(cache_key)
+        if entry is not None:
+            # Signature was verified when the entry was cached; only the exp
+            # claim needs re-checking per request, as a plain float compare
+            exp, current_user_id = entry
+            if exp <= time.time():
+                with _jwt_cache_lock:
+                    _jwt_cache.pop(cache_key, None)
+                return jsonify({'error': 'Token has expired'}), 401
+            return f(current_user_id, *args, **kwargs)
+        try:
+            data = _decode_token(token)
+            current_user_id = data['user_id']
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Token is invalid'}), 401
+        with _jwt_cache_lock:
+            _jwt_cache[cache_key] = (data['exp'], current_user_id)
+        return f(current_user_id, *args, **kwargs)
+    return decorated
+
+# -------------------
+# API Routes
+# -------------------
+
+@app.route("/")
+def home():
+    return "License Management System server is running!"
+
+@app.route('/activate', methods=['POST'])
+def activate_license():
+    """
+    Activate a license for a device
+    Expected JSON: {"license_key": "string", "device_id": "string", "device_info": "string"}
+    """
+    try:
+        data = request.get_json()
+        if not data or not all(k in data for k in ['license_key', 'device_id']):
+            return jsonify({'error': 'Missing required fields'}), 400
+
+        license_key = data['license_key']
+        device_id = data['device_id']
+        device_info = data.get('device_info', '')
+        now = utcnow()
+
+        # Core select: fetch only the needed columns, no ORM hydration or
+        # identity-map registration on the hot path
+        license_obj = db.session.execute(
+            select(License.id, License.status, License.expires_at)
+            .where(License.key == license_key)
+        ).first()
+        if not license_obj:
+            return jsonify({'error': 'Invalid license key'}), 404
+
+        if license_obj.status != 'active':
+            return jsonify({'error': 'License is not active'}), 400
+
+        # Report expiry from the timestamp alone; the background sweep will
+        # flip the status column
+        if license_obj.expires_at and license_obj.expires_at < now:
+            return jsonify({'error': 'License has expired'}), 400
+
+        # Upsert the device so two concurrent activations cannot both insert:
+        # the unique device_id index is the arbiter and the DB resolves the
+        # race in one round-trip instead of a SELECT-then-INSERT
+        stmt = _device_insert().values(
+            device_id=device_id,
+            license_id=license_obj.id,
+            device_info=device_info,
+            registered_at=now
+        ).on_conflict_do_nothing(index_elements=['device_id']).returning(Device.id)
+        inserted = db.session.execute(stmt).first()
+
+        if inserted is None:
+            # Device row already existed (possibly just inserted by a
+            # concurrent request) - decide based on its license
+            existing_device = db.session.execute(
+                select(Device.license_id).where(Device.device_id == device_id)
+            ).first()
+            if not existing_device or existing_device.license_id != license_obj.id:
+                return jsonify({'error': 'Device already registered with different license'}), 400
+            token = _issue_token(device_id, license_obj.id, now)
+            return jsonify({
+                'success': True,
+                'token': token,
+                'license_status': license_obj.status,
+                'expires_at': license_obj.expires_at
+            })
+
+        db.session.commit()
+
+        # Enqueue only after the commit succeeds: a failed device insert must
+        # not leave an audit row claiming the activation happened
+        _audit_queue.put_nowait({
+            'action': 'license_activated',
+            'license_id': license_obj.id,
+            'device_id': device_id,
+            'details': f'Device {device_id} activated license {license_key}'
+        })
+
+        token = _issue_token(device_id, license_obj.id, now)
+
+        return jsonify({
+            'success': True,
+            'token': token,
+            'license_status': license_obj.status,
+            'expires_at': license_obj.expires_at
+        })
+
+    except Exception:
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@app.route('/validate', methods=['POST'])
+@jwt_required
+def validate_license(user_id):
+    """
+    Validate a license for a device
+    Requires JWT token in Authorization header
+    """
+    try:
+        now = utcnow()
+        # Core select: fetch only the needed columns, no ORM hydration or
+        # identity-map registration on the hot path
+        device = db.session.execute(
+            select(Device.id, Device.license_id).where(Device.device_id == user_id)
+        ).first()
+        if not device:
+            return jsonify({'error': 'Device not found'}), 404
+
+        license_obj = db.session.execute(
+            select(License.status, License.expires_at).where(License.id == device.license_id)
+        ).first()
+        if not license_obj:
+            return jsonify({'error': 'License not found'}), 404
+
+        if license_obj.status != 'active':
+            return jsonify({'error': 'License is not active', 'status': license_obj.status}), 400
+
+        # Report expiry from the timestamp alone; the background sweep will
+        # flip the status column
+        if license_obj.expires_at and license_obj.expires_at < now:
+            return jsonify({'error': 'License has expired', 'status': 'expired'}), 400
+
+        db.session.execute(
+            update(Device).where(Device.id == device.id).values(last_validated=now)
+        )
+        db.session.commit()
+
+        return jsonify({
+            'valid': True,
+            'license_status': license_obj.status,
+            'expires_at': license_obj.expires_at,
+            'days_remaining': (license_obj.expires_at - now).days if license_obj.expires_at else None
+        })
+
+    except Exception:
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+# -------------------
+# Admin Routes
+# -------------------
+
+@app.route('/admin/login', methods=['GET', 'POST'])
+def admin_login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        admin = AdminUser.query.filter_by(username=username).first()
+        # Always run a hash verification so the timing is identical for
+        # unknown usernames and wrong passwords
+        password_ok = _verify_password(
+            admin.password_hash if admin else _DUMMY_PASSWORD_HASH,
+            password or ''
+        )
+        if admin and password_ok:
+            # Transparently upgrade legacy werkzeug hashes on successful login
+            if not admin.password_hash.startswith('$argon2'):
+                admin.password_hash = _password_hasher.hash(password)
+                db.session.commit()
+            login_user(admin)
+            return redirect(url_for('admin_dashboard'))
+        else:
+            flash('Invalid username or password', 'error')
+
+    return render_template('admin/login.html')
+
+
+@app.route('/admin/logout')
+@login_required
+def admin_logout():
+    logout_user()
+    return redirect(url_for('admin_login'))
+
+
+@app.route('/admin')
+@login_required
+def admin_dashboard():
+    page = request.args.get('page', 1, type=int)
+    # Eager-load everything the template walks so rendering does not fire a
+    # lazy query per row (N+1), and paginate instead of shipping every row
+    licenses = License.query.options(selectinload(License.devices)).paginate(
+        page=page, per_page=50, error_out=False)
+    # Devices render as a flat table, so skip ORM hydration entirely and map
+    # the column select onto slotted read models
+    device_rows = _page_rows(
+        select(Device.id, Device.device_id, Device.device_info, Device.registered_at,
+               Device.last_validated, Device.is_active, Device.license_id),
+        page)
+    devices = [DeviceRow(*row) for row in device_rows]
+    recent_logs = AuditLog.query.options(
+        joinedload(AuditLog.license),
+        joinedload(AuditLog.admin_user)
+    ).order_by(AuditLog.created_at.desc()).limit(10).all()
+    return render_template('admin/dashboard.html', licenses=licenses, devices=devices, recent_logs=recent_logs)
+
+
+@app.route('/admin/licenses')
+@login_required
+def admin_licenses():
+    page = request.args.get('page', 1, type=int)
+    # Flat listing: a Core column select mapped onto slotted read models
+    # allocates no ORM instances for the table rows
+    license_rows = _page_rows(
+        select(License.id, License.key, License.status,
+               License.expires_at, License.created_at),
+        page)
+    licenses = [LicenseRow(*row) for row in license_rows]
+    total = db.session.scalar(select(func.count()).select_from(License))
+    return render_template('admin/licenses.html', licenses=licenses,
+                           page=page, total=total)
+
+
+@app.route('/admin/licenses/create', methods=['POST'])
+@login_required
+def create_license():
+    try:
+        key = request.form.get('key')
+        duration_days = int(request.form.get('duration_days', 7))
+
+        if not key:
+            flash('License key is required', 'error')
+            return redirect(url_for('admin_licenses'))
+
+        if License.query.filter_by(key=key).first():
+            flash('License key already exists', 'error')
+            return redirect(url_for('admin_licenses'))
+
+        expires_at = utcnow() + timedelta(days=duration_days)
+        license_obj = License(key=key, status='active', expires_at=expires_at, created_by=current_user.id)
+        db.session.add(license_obj)
+        db.session.commit()
+
+        flash('License created successfully', 'success')
+        return redirect(url_for('admin_licenses'))
+
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('create_license failed')
+        return jsonify({'error': 'Internal server error'}), 500
+
@@ -1,105 +1,153 @@
-from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import UserMixin
-
-db = SQLAlchemy()
-
-class AdminUser(UserMixin, db.Model):
-    __tablename__ = 'admin_users'
-
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
-    is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_login = db.Column(db.DateTime)
-
-    # Relații explicit foreign_keys
-    created_licenses = db.relationship(
-        'License',
-        foreign_keys='License.created_by',
-        backref='creator',
-        lazy='dynamic'
-    )
-    revoked_licenses = db.relationship(
-        'License',
-        foreign_keys='License.revoked_by',
-        backref='revoker',
-        lazy='dynamic'
-    )
-
-    audit_logs = db.relationship('AuditLog', back_populates='admin_user')
-
-    def __repr__(self):
-        return f'<AdminUser {self.username}>'
-
-class License(db.Model):
-    __tablename__ = 'licenses'
-
-    id = db.Column(db.Integer, primary_key=True)
-    key = db.Column(db.String(255), unique=True, nullable=False, index=True)
-    status = db.Column(db.String(20), default='active', nullable=False)
-    expires_at = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    revoked_at = db.Column(db.DateTime)
-
-    created_by = db.Column(db.Integer, db.ForeignKey('admin_users.id'))
-    revoked_by = db.Column(db.Integer, db.ForeignKey('admin_users.id'))
-
-    devices = db.relationship('Device', backref='license', lazy='dynamic')
-    audit_logs = db.relationship('AuditLog', backref='license', lazy='dynamic')
-
-    def __repr__(self):
-        return f'<License {self.key}>'
-
-    @property
-    def is_expired(self):
-        if not self.expires_at:
-            return False
-        return datetime.utcnow() > self.expires_at
-
-    @property
-    def days_remaining(self):
-        if not self.expires_at:
-            return None
-        delta = self.expires_at - datetime.utcnow()
-        return max(delta.days, 0)
-
-class Device(db.Model):
-    __tablename__ = 'devices'
-
-    id = db.Column(db.Integer, primary_key=True)
-    device_id = db.Column(db.String(255), nullable=False, index=True)
-    device_info = db.Column(db.Text)
-    fcm_token = db.Column(db.String(255))
-    registered_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_validated = db.Column(db.DateTime)
-    is_active = db.Column(db.Boolean, default=True)
-
-    license_id = db.Column(db.Integer, db.ForeignKey('licenses.id'), nullable=False)
-
-    audit_logs = db.relationship('AuditLog', backref='device', lazy='dynamic')
-
-    def __repr__(self):
-        return f'<Device {self.device_id}>'
-
-class AuditLog(db.Model):
-    __tablename__ = 'audit_logs'
-
-    id = db.Column(db.Integer, primary_key=True)
-    action = db.Column(db.String(100), nullable=False)
-    details = db.Column(db.Text)
-    ip_address = db.Column(db.String(45))
-    user_agent = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    license_id = db.Column(db.Integer, db.ForeignKey('licenses.id'))
-    device_id = db.Column(db.String(255))
-    admin_user_id = db.Column(db.Integer, db.ForeignKey('admin_users.id'))
-
-    # Relație fără backref conflictual
-    admin_user = db.relationship('AdminUser', back_populates='audit_logs')
-
-    def __repr__(self):
-        return f'<AuditLog {self.action} at {self.created_at}>'
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import UserMixin
+
+db = SQLAlchemy()
+
+def utcnow():
+    """Naive UTC now; datetime.utcnow is deprecated since Python 3.12"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class AdminUser(UserMixin, db.Model):
+    __tablename__ = 'admin_users'
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    last_login = db.Column(db.DateTime)
+
+    # Relații explicit foreign_keys
+    created_licenses = db.relationship(
+        'License',
+        foreign_keys='License.created_by',
+        backref='creator',
+        lazy='dynamic'
+    )
+    revoked_licenses = db.relationship(
+        'License',
+        foreign_keys='License.revoked_by',
+        backref='revoker',
+        lazy='dynamic'
+    )
+
+    audit_logs = db.relationship('AuditLog', back_populates='admin_user')
+
+    def __repr__(self):
+        return f'<AdminUser {self.username}>'
+
+class License(db.Model):
+    __tablename__ = 'licenses'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    status = db.Column(db.String(20), default='active', nullable=False)
+    expires_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    revoked_at = db.Column(db.DateTime)
+
+    created_by = db.Column(db.Integer, db.ForeignKey('admin_users.id'))
+    revoked_by = db.Column(db.Integer, db.ForeignKey('admin_users.id'))
+
+    # lazy='select' (not 'dynamic') so the relationship can be eagerly loaded
+    devices = db.relationship('Device', backref='license', lazy='select')
+    audit_logs = db.relationship('AuditLog', backref='license', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<License {self.key}>'
+
+    @property
+    def is_expired(self):
+        if not self.expires_at:
+            return False
+        return utcnow() > self.expires_at
+
+    @property
+    def days_remaining(self):
+        if not self.expires_at:
+            return None
+        delta = self.expires_at - utcnow()
+        return max(delta.days, 0)
+
+class Device(db.Model):
+    __tablename__ = 'devices'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Unique: activation logic keeps devices 1:1 with device_id, and a unique
+    # index lets lookups on the hot path stop at the first match
+    device_id = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    device_info = db.Column(db.Text)
+    registered_at = db.Column(db.DateTime, default=utcnow)
+    last_validated = db.Column(db.DateTime)
+    is_active = db.Column(db.Boolean, default=True)
+
+    license_id = db.Column(db.Integer, db.ForeignKey('licenses.id'), nullable=False, index=True)
+
+    tokens = db.relationship('DeviceToken', backref='device', lazy='select')
+    audit_logs = db.relationship('AuditLog', backref='device', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<Device {self.device_id}>'
+
+class DeviceToken(db.Model):
+    """Push-notification tokens, split out of Device so the /validate hot row
+    stays narrow and a device can register several tokens (phone + tablet)"""
+    __tablename__ = 'device_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    fcm_token = db.Column(db.String(255), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow)
+
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<DeviceToken for device {self.device_id}>'
+
+class AuditLog(db.Model):
+    __tablename__ = 'audit_logs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    action = db.Column(db.String(100), nullable=False)
+    details = db.Column(db.Text)
+    ip_address = db.Column(db.String(45))
+    user_agent = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utcnow)
+
+    license_id = db.Column(db.Integer, db.ForeignKey('licenses.id'))
+    # FK onto the (unique) business key so Device.audit_logs has a join path;
+    # without it mapper configuration raises NoForeignKeysError on first use
+    device_id = db.Column(db.String(255), db.ForeignKey('devices.device_id'))
+    admin_user_id = db.Column(db.Integer, db.ForeignKey('admin_users.id'))
+
+    # Relație fără backref conflictual
+    admin_user = db.relationship('AdminUser', back_populates='audit_logs')
+
+    def __repr__(self):
+        return f'<AuditLog {self.action} at {self.created_at}>'
+
+# Read models for admin listings: plain slotted dataclasses built from Core
+# column selects, so rendering a big table allocates no ORM instances - no
+# identity map entry, no lazy-loader proxies, no per-row __dict__.
+
+@dataclass(slots=True)
+class LicenseRow:
+    id: int
+    key: str
+    status: str
+    expires_at: Optional[datetime]
+    created_at: Optional[datetime]
+
+@dataclass(slots=True)
+class DeviceRow:
+    id: int
+    device_id: str
+    device_info: Optional[str]
+    registered_at: Optional[datetime]
+    last_validated: Optional[datetime]
+    is_active: bool
+    license_id: int